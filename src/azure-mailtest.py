@@ -2,16 +2,20 @@ import asyncio
 import configparser
 import argparse
 import hashlib
+import html
 import logging
 import os
+import string
 import sys
 import segno
 import pandas as pd
 from datetime import datetime
-from PIL import Image, ImageDraw, ImageFont
 from msgraph.generated.models.o_data_errors.o_data_error import ODataError
 from msgraph.generated.models.file_attachment import FileAttachment
 from graphmail import Graph  # Use relative import if client.py is in the same directory
+from passurl import pass_url
+from passrender import PassRenderer, PrintSheet
+from stageprofile import profiler, add_profile_arguments, setup_profiling
 
 # global variables
 config = None
@@ -22,9 +26,37 @@ stats = {
     'emails_sent': 0,
     'emails_failed': 0,
     'qr_codes_generated': 0,
-    'members_without_email': 0
+    'members_without_email': 0,
+    'png_bytes': 0
 }
 member_df = None
+members_without_email_df = None
+renderer = None
+email_template = None
+last_generated_png = {}
+
+# Placeholders of the email template and the member data columns they are filled from
+template_fields = {
+    'anrede': 'Anrede',
+    'vorname': 'Vorname',
+    'nachname': 'Nachname',
+    'mitgliedsnummer': 'RML MitglNr',
+    'email': 'E-Mail',
+    'qrcode_cid': None  # content ID of the inline pass image (HTML emails)
+}
+pass_content_id = 'mitgliedsausweis'
+
+# Columns of the member export used for mailing, with their dtypes.
+# All other columns (address, IBAN, birth date, ...) are never loaded.
+MEMBER_COLUMNS = {
+    'RML MitglNr': 'Int64',
+    'Anrede': str,
+    'Vorname': str,
+    'Nachname': str,
+    'E-Mail': str,
+    'Austritt': str,
+    'hash': str
+}
 
 async def main():
     print('Python Graph Tutorial\n')
@@ -42,8 +74,10 @@ async def main():
                        help='Maximum number of emails to send (for testing)')
     parser.add_argument('--dry-run', action='store_true',
                        help='Generate QR codes but do not send emails')
+    add_profile_arguments(parser)
     
     args = parser.parse_args()
+    setup_profiling(args)
 
     # Load settings
     config = configparser.ConfigParser()
@@ -54,7 +88,8 @@ async def main():
     # logger.info("Configuration and logging setup complete.")
 
     # Load member data
-    member_df = load_member_data()
+    with profiler.stage('load member data'):
+        member_df = load_member_data()
     if member_df is None:
         print("Failed to load member data. Exiting.")
         return
@@ -75,6 +110,7 @@ async def main():
         print('3. Send testmail')
         print('4. Send all passes to members')
         print('5. Send pass to single member')
+        print('6. Print passes for members without email')
 
         try:
             choice = int(input())
@@ -87,7 +123,7 @@ async def main():
             elif choice == 1:
                 await display_access_token(client)
             elif choice == 2:
-                dry_run(client)
+                dry_run()
             elif choice == 3:
                 if args.test_email:
                     mailto = args.test_email
@@ -98,6 +134,8 @@ async def main():
                 await send_all_passes(client)
             elif choice == 5:
                 await send_pass_to_single_member(client)
+            elif choice == 6:
+                print_passes()
             else:
                 print('Invalid choice!\n')
         except ODataError as odata_error:
@@ -122,9 +160,13 @@ async def send_testmail(client: Graph, mailto: str):
     # generate QR code for test mail
     qr_code_path = generate_qr_code(member_df.iloc[0])
     message = create_message(member_df.iloc[0], qr_code_path)
+    if not message:
+        print('Test mail not sent.\n')
+        return 1
     # Send mail to the specified address
     message['recipient'] = mailto
-    await client.send_qr_mail(message)
+    with profiler.stage('graph send'):
+        await client.send_qr_mail(message)
     print('Mail sent to ', mailto, '\n')
     # logger.info(f"Test email sent to {mailto}")
     log_statistics()
@@ -146,12 +188,18 @@ async def send_all_passes(client: Graph):
             if qr_code_path:
                 # Send email
                 message = create_message(member, qr_code_path)
-                if await client.send_qr_mail(message):
+                if not message:
+                    print(f"Skipping email for {member['Vorname']} {member['Nachname']} - email could not be created")
+                    continue
+                with profiler.stage('graph send'):
+                    sent = await client.send_qr_mail(message)
+                if sent:
                     success_count += 1
                 
                 # Small delay to avoid overwhelming SMTP server
                 import time
-                time.sleep(1)
+                with profiler.stage('send delay'):
+                    time.sleep(1)
             else:
                 print(f"Skipping email for {member['Vorname']} {member['Nachname']} - QR code generation failed")
                 
@@ -176,7 +224,11 @@ async def send_pass_to_single_member(client: Graph):
     # print(f'Found member data: {member_data.to_dict()}')
     qr_code_path = generate_qr_code(member_data)
     message = create_message(member_data, qr_code_path)
-    await client.send_qr_mail(message)
+    if not message:
+        print(f'Pass not sent to member: {membername}\n')
+        return
+    with profiler.stage('graph send'):
+        await client.send_qr_mail(message)
     print(f'Pass sent to member: {membername}\n')
 
     stats['emails_sent'] += 1
@@ -199,29 +251,66 @@ def setup_logging():
     logger = logging.getLogger("asyncio")
     logger.info(f"Starting email send process. Log file: {log_filename}")
 
+def read_member_file(member_file):
+    # Read the member export, keeping only the columns listed in MEMBER_COLUMNS.
+    # Columns that are missing from the export (e.g. 'hash') are simply skipped.
+    def wanted(column):
+        return column in MEMBER_COLUMNS
+
+    if member_file.endswith('.xlsx'):
+        try:
+            return pd.read_excel(member_file, engine='openpyxl',
+                                 usecols=wanted, dtype=MEMBER_COLUMNS)
+        except Exception:
+            # Fall back to CSV
+            member_file = member_file.replace('.xlsx', '.csv')
+    return pd.read_csv(member_file, sep=';', usecols=wanted, dtype=MEMBER_COLUMNS)
+
 def load_member_data():
     global config
     global logger
     global stats
+    global members_without_email_df
     # Load member data from Excel file.
     try:
-        # Try Excel file first
         excel_file = config.get('FILES', 'excel_file')
+        use_cache = config.getboolean('FILES', 'member_cache', fallback=True)
+
+        # The cache is only valid for the exact source files it was built from: the
+        # export itself and, for .xlsx exports, the CSV that read_member_file falls back to
+        cache_file = f"{excel_file}.cache"
+        source_files = [excel_file]
         if excel_file.endswith('.xlsx'):
+            source_files.append(excel_file.replace('.xlsx', '.csv'))
+        cache_key = [sorted(MEMBER_COLUMNS)]
+        for source_file in source_files:
+            if os.path.exists(source_file):
+                source = os.stat(source_file)
+                cache_key.append((source_file, source.st_mtime_ns, source.st_size))
+
+        df = None
+        if use_cache and os.path.exists(cache_file):
             try:
-                df = pd.read_excel(excel_file, engine='openpyxl')
-                # logger.info(f"Loaded {len(df)} members from Excel file: {excel_file}")
+                cached = pd.read_pickle(cache_file)
+                if cached['key'] == cache_key:
+                    df = cached['df']
+                    # logger.info(f"Loaded {len(df)} members from cache: {cache_file}")
             except Exception:
-                # Fall back to CSV
-                csv_file = excel_file.replace('.xlsx', '.csv')
-                df = pd.read_csv(csv_file, sep=';')
-                # logger.info(f"Loaded {len(df)} members from CSV file: {csv_file}")
-        else:
-            df = pd.read_csv(excel_file, sep=';')
-            # logger.info(f"Loaded {len(df)} members from CSV file: {excel_file}")
+                df = None
+
+        if df is None:
+            df = read_member_file(excel_file)
+            # logger.info(f"Loaded {len(df)} members from file: {excel_file}")
+            if use_cache:
+                try:
+                    pd.to_pickle({'key': cache_key, 'df': df}, cache_file)
+                except OSError as e:
+                    print(f"Could not write member cache {cache_file}: {str(e)}")
 
         # Filter members with email addresses
-        df_with_email = df[df['E-Mail'].notna() & (df['E-Mail'] != '')]
+        has_email = df['E-Mail'].notna() & (df['E-Mail'] != '')
+        df_with_email = df[has_email]
+        members_without_email_df = df[~has_email]
         stats['total_members'] = len(df)
         stats['members_without_email'] = len(df) - len(df_with_email)
 
@@ -236,15 +325,35 @@ def load_member_data():
 
 def dry_run():
     global logger
+    global member_df
     print("DRY RUN MODE: Generating QR codes only, no emails will be sent")
-    # Load data and generate QR codes only
-    df = load_member_data()
-    if df is not None:
-        for index, member in df.iterrows():
-            generate_qr_code(member)
+    # Generate QR codes only, reusing the member data loaded at startup
+    if member_df is not None:
+        print_sheet = open_print_sheet('print-sheet')
+        try:
+            for index, member in member_df.iterrows():
+                generate_qr_code(member, print_sheet)
+        finally:
+            if print_sheet is not None:
+                print_sheet.close()
+                print(f"Print sheet with {print_sheet.passes} passes: {print_sheet.path}")
     log_statistics()
     return 0
 
+def print_passes():
+    global members_without_email_df
+    # Render passes of members without email address onto a PDF print sheet
+    if members_without_email_df is None or members_without_email_df.empty:
+        print("No members without email address.")
+        return 0
+    qrcode_directory = config.get('QR_CODE', 'qrcode_directory')
+    os.makedirs(qrcode_directory, exist_ok=True)
+    with PrintSheet(f"{qrcode_directory}/print-sheet-without-email.pdf") as print_sheet:
+        for index, member in members_without_email_df.iterrows():
+            generate_qr_code(member, print_sheet)
+    print(f"Print sheet with {print_sheet.passes} passes: {print_sheet.path}")
+    return 0
+
 def log_statistics():
     global logger
     global stats
@@ -257,6 +366,8 @@ def log_statistics():
     # logger.info(f"QR codes generated: {stats['qr_codes_generated']}")
     # logger.info(f"Emails sent successfully: {stats['emails_sent']}")
     # logger.info(f"Emails failed: {stats['emails_failed']}")
+    if stats['qr_codes_generated'] > 0:
+        print(f"Average pass size: {stats['png_bytes'] // stats['qr_codes_generated']} bytes")
 
     if stats['emails_sent'] + stats['emails_failed'] > 0:
         success_rate = (stats['emails_sent'] / (stats['emails_sent'] + stats['emails_failed'])) * 100
@@ -264,7 +375,7 @@ def log_statistics():
 
     # logger.info("=" * 50)
 
-def generate_qr_code(member_data):
+def generate_qr_code(member_data, print_sheet=None):
     global logger
     global stats
     # Generate QR code for a single member (adapted from generate-pass.py).
@@ -281,81 +392,49 @@ def generate_qr_code(member_data):
         else:
             # Create MD5 hash from Vorname + Nachname + Mitgliedsnummer
             hash_input = f"{vorname}{nachname}{member_number}"
-            hash_value = hashlib.md5(hash_input.encode('utf-8')).hexdigest()
+            with profiler.stage('hash'):
+                hash_value = hashlib.md5(hash_input.encode('utf-8')).hexdigest()
             # logger.info(f"Generated MD5 hash for {vorname} {nachname}: {hash_value}")
         
         fname = vorname[0].upper() + nachname
         
         # Construct the URL
-        url = f"{config.get('QR_CODE', 'url_domain')}?hash={hash_value}"
+        compact = config.getboolean('QR_CODE', 'compact_payload', fallback=False)
+        url = pass_url(config.get('QR_CODE', 'url_domain'), hash_value, compact)
         
-        # Generate the QR code
-        qr = segno.make_qr(url, error='h')
-        qr_pil = qr.to_pil(scale=5, border=3, dark='black', light='white').convert("RGB")
-        
-        # Load and add logo
-        logo_path = config.get('QR_CODE', 'logo_path')
-        if os.path.exists(logo_path):
-            logo = Image.open(logo_path)
-            qr_pil.paste(logo, (qr_pil.size[0] // 2 - logo.size[0] // 2, 
-                                qr_pil.size[1] // 2 - logo.size[1] // 2), logo)
-        
-        # Create styled background
-        image_width = qr_pil.size[0]
-        margin = 10
-        
-        # Setup font
-        font_name = config.get('QR_CODE', 'font_name')
-        font_size = 20
-        try:
-            font = ImageFont.truetype(font_name, size=font_size)
-        except:
-            print(f"Failed to load font {font_name}")
-            return None
-        
-        text = f"{vorname} {nachname}"
-
-        # Calculate text size and ensure it fits within the image width with margins
-        draw = ImageDraw.Draw(qr_pil)
-        text_width = font.getbbox(text)[2]
-        while text_width > (image_width - 2 * margin):
-            font = ImageFont.truetype(font_name, font.size - 1)  # Reduce font size
-            text_width = font.getbbox(text)[2]
-
-        while text_width < (image_width - 2 * margin):
-            font = ImageFont.truetype(font_name, font.size + 1)  # Increase font size
-            text_width = font.getbbox(text)[2]
-
-        
-        # Create final image with text space
-        text_height = font.getbbox(text)[3]
-        image_height = qr_pil.size[1] + text_height + 20  # Add space for text
-        final_image = Image.new("RGB", (image_width + 2 * margin, image_height), "green")
-        
-        # Paste QR code
-        final_image.paste(qr_pil, (margin, margin))
-        
-        # Add styled borders
-        draw = ImageDraw.Draw(final_image)
-        draw.rounded_rectangle((4, 4, final_image.size[0]-4, qr_pil.size[1]+13), 
-                                outline="green", fill=None, width=7, radius=10)
-        draw.rounded_rectangle((9, 9, final_image.size[0]-9, qr_pil.size[1]+9), 
-                                outline="black", fill=None, width=3, radius=10)
-        
-        # Add member name text
-        text_x = (final_image.size[0] - text_width) / 2
-        text_y = qr_pil.size[1] + (image_height - qr_pil.size[1] - text_height - 10 )  # Position text below the QR code
-        draw.text((text_x, text_y), text, fill="white", font=font)
+        # Generate the QR code, encoded once for all output formats
+        with profiler.stage('qr encode'):
+            qr = segno.make_qr(url, error='h')
+        renderer = get_renderer()
+        with profiler.stage('render'):
+            final_image = renderer.render_image(qr, f"{vorname} {nachname}")
         
         # Save QR code
         qrcode_directory = config.get('QR_CODE', 'qrcode_directory')
         os.makedirs(qrcode_directory, exist_ok=True)
         qr_filename = f"{qrcode_directory}/{fname}{member_number}.png"
-        final_image.save(qr_filename, "PNG")
+        png_data = renderer.encode_png(final_image, config.getboolean('QR_CODE', 'palette_png', fallback=True))
+        with profiler.stage('write files'):
+            with open(qr_filename, 'wb') as f:
+                f.write(png_data)
+        # Keep the PNG just written, so create_message does not read it back from disk
+        last_generated_png.clear()
+        last_generated_png[qr_filename] = png_data
+
+        # Additional output formats from the same QR matrix
+        if 'svg' in output_formats():
+            with profiler.stage('svg render'):
+                svg_data = renderer.render_svg(qr, f"{vorname} {nachname}")
+            with profiler.stage('write files'):
+                with open(f"{qrcode_directory}/{fname}{member_number}.svg", 'w', encoding='utf-8') as f:
+                    f.write(svg_data)
+        if print_sheet is not None:
+            print_sheet.add(final_image)
         
         stats['qr_codes_generated'] += 1
+        stats['png_bytes'] += len(png_data)
         # logger.info(f"Generated QR code: {qr_filename}")
-        print(f"Generated QR code: {qr_filename}")
+        print(f"Generated QR code: {qr_filename} ({len(png_data)} bytes)")
 
         return qr_filename
         
@@ -363,6 +442,28 @@ def generate_qr_code(member_data):
         print(f"Failed to generate QR code for {vorname} {nachname}: {str(e)}")
         return None
 
+def get_renderer():
+    global renderer
+    # Logo and fonts are loaded once per run
+    if renderer is None:
+        logo_path = config.get('QR_CODE', 'logo_path')
+        renderer = PassRenderer(logo_path if os.path.exists(logo_path) else None,
+                                config.get('QR_CODE', 'font_name'))
+    return renderer
+
+def output_formats():
+    # Output formats from the configuration, e.g. "png, svg, pdf"
+    formats = config.get('QR_CODE', 'output_formats', fallback='png')
+    return [f.strip().lower() for f in formats.split(',') if f.strip()]
+
+def open_print_sheet(name):
+    # Open a PDF print sheet in the QR code directory if "pdf" output is configured
+    if 'pdf' not in output_formats():
+        return None
+    qrcode_directory = config.get('QR_CODE', 'qrcode_directory')
+    os.makedirs(qrcode_directory, exist_ok=True)
+    return PrintSheet(f"{qrcode_directory}/{name}.pdf")
+
 def create_message(member_data, qr_code_path):
     global logger
     global stats
@@ -374,21 +475,31 @@ def create_message(member_data, qr_code_path):
         message['recipient'] = (member_data['E-Mail'].strip())
         message['subject'] = config.get('EMAIL', 'subject')
 
-        # Load and personalize email template
-        template = load_email_template()
-        email_body = personalize_email(template, member_data)
+        # Personalize the email template (loaded and compiled once per run)
+        with profiler.stage('template personalization'):
+            template = get_email_template()
+            email_body = personalize_email(template, member_data)
 
         # Add email body
         message['body'] = email_body
-
-        # Attach QR code image
-        if qr_code_path and os.path.exists(qr_code_path):
-            with open(qr_code_path, 'rb') as f:
-                img_data = f.read()
+        message['body_type'] = template['body_type']
+
+        # Attach QR code image, taken from memory if it was just generated
+        if qr_code_path and (qr_code_path in last_generated_png or os.path.exists(qr_code_path)):
+            img_data = last_generated_png.get(qr_code_path)
+            if img_data is None:
+                with open(qr_code_path, 'rb') as f:
+                    img_data = f.read()
             
             message['qrcode'] = img_data
             filename = f"QR_Code_{member_data['Vorname']}_{member_data['Nachname']}.png"
             message['qrcode_filename'] = filename
+            # Show the pass inside the HTML body instead of as a separate attachment
+            if template['body_type'] == 'html' and 'qrcode_cid' in template['fields']:
+                message['qrcode_cid'] = pass_content_id
+        elif template['body_type'] == 'html' and 'qrcode_cid' in template['fields']:
+            # The HTML body would show a broken image without the pass
+            raise ValueError(f"Pass image missing: {qr_code_path}")
 
         stats['emails_sent'] += 1
         # logger.info(f"Email created successfully for {member_data['E-Mail']} ({member_data['Vorname']} {member_data['Nachname']})")
@@ -396,39 +507,64 @@ def create_message(member_data, qr_code_path):
 
     except Exception as e:
         stats['emails_failed'] += 1
-        logger.error(f"Failed to create email for {member_data.get('E-Mail', 'unknown')}: {str(e)}")
+        print(f"Failed to create email for {member_data.get('E-Mail', 'unknown')}: {str(e)}")
     return False
 
 
-def load_email_template():
+def load_email_template(template_file):
     # Load email template from file.
     global config
     global logger
-    template_file = config.get('FILES', 'template_file')
     try:
         with open(template_file, 'r', encoding='utf-8') as f:
             return f.read()
     except FileNotFoundError:
-        logger.error(f"Email template file not found: {template_file}")
+        print(f"Email template file not found: {template_file}")
         return None
     except Exception as e:
-        logger.error(f"Error loading template: {str(e)}")
+        print(f"Error loading template: {str(e)}")
         return None
 
+def get_email_template():
+    global email_template
+    # Load and compile the email template on first use. The body type ("text" or "html")
+    # selects the template file. Unknown placeholders are reported once here and kept
+    # unchanged in the personalized emails.
+    if email_template is None:
+        body_type = config.get('EMAIL', 'body_type', fallback='text').strip().lower()
+        if body_type == 'html':
+            template_file = config.get('FILES', 'html_template_file')
+        else:
+            template_file = config.get('FILES', 'template_file')
+        text = load_email_template(template_file)
+        if text is None:
+            raise ValueError(f"Email template could not be loaded: {template_file}")
+
+        parts = []
+        fields = set()
+        for literal, field, format_spec, conversion in string.Formatter().parse(text):
+            if field is not None:
+                fields.add(field)
+                if field not in template_fields:
+                    print(f"Unknown template field {{{field}}} in {template_file}, it is left unchanged")
+                    literal += '{' + field + (f"!{conversion}" if conversion else '') + (f":{format_spec}" if format_spec else '') + '}'
+                    field = None
+            parts.append((literal, field, format_spec))
+        email_template = {'body_type': body_type, 'parts': parts, 'fields': fields}
+    return email_template
+
 def personalize_email(template, member_data):
     global logger
-    # Personalize email template with member data.
-    try:
-        return template.format(
-            anrede=member_data.get('Anrede', ''),
-            vorname=member_data.get('Vorname', ''),
-            nachname=member_data.get('Nachname', ''),
-            mitgliedsnummer=member_data.get('RML MitglNr', ''),
-            email=member_data.get('E-Mail', '')
-        )
-    except KeyError as e:
-        logger.warning(f"Missing template field {e} for member {member_data.get('RML MitglNr', 'unknown')}")
-        return template
+    # Personalize the compiled email template with member data.
+    values = {'qrcode_cid': pass_content_id}
+    for field, column in template_fields.items():
+        if column is not None:
+            value = member_data.get(column, '')
+            values[field] = '' if pd.isna(value) else str(value)
+    if template['body_type'] == 'html':
+        values = {field: html.escape(value) for field, value in values.items()}
+    return ''.join(literal + (format(values[field], format_spec) if field else '')
+                   for literal, field, format_spec in template['parts'])
 
 # Run main
 asyncio.run(main())
\ No newline at end of file
@@ -1,15 +1,19 @@
+import argparse
 import pandas as pd
 import segno
-from PIL import Image, ImageDraw, ImageFont, ImagePath
-import sys
+from passurl import pass_url
+from passrender import PassRenderer, PrintSheet
+from stageprofile import profiler, add_profile_arguments, setup_profiling
 
 url_domain = "https://xw24b2obnym7ofrwk2ckhqktc40cglku.lambda-url.us-east-1.on.aws/"  # Replace with your actual domain
 qrcode_directory = "../qr-codes"  # Directory where the QR-codes are stored
+compact_payload = False  # Use the shorter uppercase URL form for smaller QR codes
+output_formats = ["png"]  # Any of "png", "svg" and "pdf" (multi-up A4 print sheet)
+palette_png = True  # Write PNGs with a small fixed palette instead of 24-bit RGB
+font_name = "OpenSans-Medium.ttf"  # Path to your TTF font file
+logo_path = "logo-rml3.png"  # Path to your logo image
 
-def nice_qr_code(matching_row):
-    font_name = "OpenSans-Medium.ttf"  # Path to your TTF font file
-    logo = Image.open("logo-rml3.png")  # Path to your logo image
-
+def nice_qr_code(matching_row, renderer, print_sheet=None):
     # Extract the required values
     vorname = matching_row.iloc[0]['Vorname']
     nachname = matching_row.iloc[0]['Nachname']
@@ -18,49 +22,29 @@ def nice_qr_code(matching_row):
     fname = vorname[0].upper() + nachname
 
     # Construct the URL
-    url = f"{url_domain}?hash={hash_value}"
-
-    # Generate the QR code
-    qr = segno.make(url,error='h')
-    qr_pil = qr.to_pil(scale=5, border=3, dark='black', light='white').convert("RGB")
-    # Add logo to the QR code
-    qr_pil.paste(logo, (qr_pil.size[0] // 2 - logo.size[0] // 2, qr_pil.size[1] // 2 - logo.size[1] // 2), logo)
-
-    # Create a blank image to embed the QR code and text
-    image_width = qr_pil.size[0]
-    margin = 10
-    font = ImageFont.truetype(font_name)  # Use ttf font
-    text = f"{vorname} {nachname}"
-
-    # Calculate text size and ensure it fits within the image width with margins
-    draw = ImageDraw.Draw(qr_pil)
-    text_width = font.getbbox(text)[2]
-    while text_width > (image_width - 2 * margin):
-        font = ImageFont.truetype(font_name, font.size - 1)  # Reduce font size
-        text_width = font.getbbox(text)[2]
-
-    while text_width < (image_width - 2 * margin):
-        font = ImageFont.truetype(font_name, font.size + 1)  # Increase font size
-        text_width = font.getbbox(text)[2]
-
-    # Create a new image with space for the text
-    text_height = font.getbbox(text)[3]
-    image_height = qr_pil.size[1] + text_height + 20  # Add space for text
-    final_image = Image.new("RGB", (image_width + 2 * margin, image_height), "green")
+    url = pass_url(url_domain, hash_value, compact_payload)
 
-    # Paste the QR code onto the blank image
-    final_image.paste(qr_pil, (margin, margin))
-    draw = ImageDraw.Draw(final_image)
-    draw.rounded_rectangle((4, 4, final_image.size[0]-4, qr_pil.size[1]+13), outline="green", fill=None, width=7, radius=10)
-    draw.rounded_rectangle((9, 9, final_image.size[0]-9, qr_pil.size[1]+9), outline="black", fill=None, width=3, radius=10)
-
-    # Add text below the QR code
-    draw = ImageDraw.Draw(final_image)
-    text_x = (final_image.size[0] - text_width) / 2
-    text_y = qr_pil.size[1] + (image_height - qr_pil.size[1] - text_height - 10 )  # Position text below the QR code
-    draw.text((text_x, text_y), text, fill="white", font=font)
-
-    final_image.save(f"{qrcode_directory}/{fname}{member_number}.png", "PNG")
+    # Generate the QR code once and emit all output formats from it
+    with profiler.stage('qr encode'):
+        qr = segno.make(url,error='h')
+    text = f"{vorname} {nachname}"
+    with profiler.stage('render'):
+        final_image = renderer.render_image(qr, text)
+
+    if "png" in output_formats:
+        png_data = renderer.encode_png(final_image, palette_png)
+        with profiler.stage('write files'):
+            with open(f"{qrcode_directory}/{fname}{member_number}.png", "wb") as png_file:
+                png_file.write(png_data)
+        print(f"PNG size: {len(png_data)} bytes")
+    if "svg" in output_formats:
+        with profiler.stage('svg render'):
+            svg_data = renderer.render_svg(qr, text)
+        with profiler.stage('write files'):
+            with open(f"{qrcode_directory}/{fname}{member_number}.svg", "w", encoding="utf-8") as svg_file:
+                svg_file.write(svg_data)
+    if print_sheet is not None:
+        print_sheet.add(final_image)
 
 def generate_qr_codes_from_file(input_file, csv_file_path):
     """
@@ -75,37 +59,50 @@ def generate_qr_codes_from_file(input_file, csv_file_path):
             membership_numbers = [line.strip() for line in file.readlines()]
 
         # Read the CSV file
-        df = pd.read_csv(csv_file_path)
+        with profiler.stage('read csv'):
+            df = pd.read_csv(csv_file_path)
 
         # Ensure the required columns exist
         if 'RML MitglNr' not in df.columns or 'Vorname' not in df.columns or 'Nachname' not in df.columns or 'hash' not in df.columns:
             raise ValueError("The CSV file must contain 'RML MitglNr', 'Vorname', 'Nachname', and 'hash' columns.")
 
-        for member_number in membership_numbers:
-            try:
-                # Find the row where the member number matches
-                matching_row = df[df['RML MitglNr'] == int(member_number)]
-
-                if matching_row.empty:
-                    raise ValueError(f"No member found with member number {member_number}.")
-
-                nice_qr_code(matching_row)
-                print(f"QR code generated for member number: {member_number}")
-            except ValueError as e:
-                print(f"Error generating QR code for member number {member_number}: {e}")
+        renderer = PassRenderer(logo_path, font_name)
+        print_sheet = PrintSheet(f"{qrcode_directory}/print-sheet.pdf") if "pdf" in output_formats else None
+
+        try:
+            for member_number in membership_numbers:
+                try:
+                    # Find the row where the member number matches
+                    matching_row = df[df['RML MitglNr'] == int(member_number)]
+
+                    if matching_row.empty:
+                        raise ValueError(f"No member found with member number {member_number}.")
+
+                    nice_qr_code(matching_row, renderer, print_sheet)
+                    print(f"QR code generated for member number: {member_number}")
+                except ValueError as e:
+                    print(f"Error generating QR code for member number {member_number}: {e}")
+        finally:
+            if print_sheet is not None:
+                print_sheet.close()
+                print(f"Print sheet with {print_sheet.passes} passes: {print_sheet.path}")
     except FileNotFoundError:
         print(f"Input file '{input_file}' not found.")
     except Exception as e:
         print(f"An error occurred: {e}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python generate-pass.py <membership_number_file> <csv_file>")
-        sys.exit(1)
-    else:
-        print("Generating QR codes...")
-
-    input_file = sys.argv[1]
-    csv_file = sys.argv[2]
+    parser = argparse.ArgumentParser(description='Generate membership passes',
+                                     usage='python generate-pass.py <membership_number_file> <csv_file> [--profile]')
+    parser.add_argument('membership_number_file', help='File with one membership number per line')
+    parser.add_argument('csv_file', help='CSV file with member data and hashes')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    setup_profiling(args)
+
+    print("Generating QR codes...")
+
+    input_file = args.membership_number_file
+    csv_file = args.csv_file
 
     generate_qr_codes_from_file(input_file, csv_file)
\ No newline at end of file
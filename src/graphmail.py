@@ -86,7 +86,10 @@ class Graph:
         message.subject = prep_message['subject']
 
         message.body = ItemBody()
-        message.body.content_type = BodyType.Text
+        if prep_message.get('body_type') == 'html':
+            message.body.content_type = BodyType.Html
+        else:
+            message.body.content_type = BodyType.Text
         message.body.content = prep_message['body']
 
         to_recipient = Recipient()
@@ -102,6 +105,10 @@ class Graph:
             attachment.name = prep_message['qrcode_filename']
             attachment.content_type = "image/png"
             attachment.content_bytes = file_content
+            if 'qrcode_cid' in prep_message:
+                # Inline image, referenced from the HTML body as cid:<content id>
+                attachment.is_inline = True
+                attachment.content_id = prep_message['qrcode_cid']
             message.attachments.append(attachment)
 
         request_body = SendMailPostRequestBody()
@@ -1,8 +1,99 @@
+import base64
 import csv
 import html
+import os
+import re
+import sys
+import time
+import atexit
+import threading
 
-def find_name_by_hash(csv_file_path, input_hash):
-    # Open the CSV file
+# Scan audit log
+# Every validation is recorded as one compact line:
+#   SCAN <UTC timestamp> <result> <hash prefix> <user agent class>
+# Records are written either to the function log stream (stdout) or to the file
+# given in SCAN_LOG_FILE. The Lambda handler writes its record at the end of every
+# invocation, because a frozen or terminated execution environment would lose a
+# buffer. The long-running validation server buffers records and writes them in
+# batches of SCAN_LOG_BATCH, or with the next scan once the buffer is older than
+# SCAN_LOG_MAX_AGE seconds.
+SCAN_LOG_FILE = os.environ.get('SCAN_LOG_FILE')
+SCAN_LOG_BATCH = int(os.environ.get('SCAN_LOG_BATCH', '20'))
+SCAN_LOG_MAX_AGE = float(os.environ.get('SCAN_LOG_MAX_AGE', '30'))
+scan_buffer = []
+scan_buffer_since = time.monotonic()
+scan_lock = threading.Lock()
+
+def classify_user_agent(user_agent):
+    # Reduce the user agent to a coarse class, nothing that identifies a device
+    ua = (user_agent or '').lower()
+    if not ua:
+        return 'none'
+    if 'bot' in ua or 'crawl' in ua or 'spider' in ua or 'curl' in ua or 'python' in ua:
+        return 'bot'
+    if 'android' in ua:
+        return 'android'
+    if 'iphone' in ua or 'ipad' in ua or 'ios' in ua:
+        return 'ios'
+    if 'windows' in ua:
+        return 'windows'
+    if 'mac os' in ua or 'macintosh' in ua:
+        return 'mac'
+    if 'linux' in ua:
+        return 'linux'
+    return 'other'
+
+def flush_scan_log():
+    # Write all buffered scan records in one go. Logging must never break
+    # validation, so any error here is swallowed and the records are dropped.
+    global scan_buffer, scan_buffer_since
+    with scan_lock:
+        if not scan_buffer:
+            return
+        lines, scan_buffer = scan_buffer, []
+        scan_buffer_since = time.monotonic()
+    try:
+        data = '\n'.join(lines) + '\n'
+        if SCAN_LOG_FILE:
+            with open(SCAN_LOG_FILE, 'a', encoding='utf-8') as log_file:
+                log_file.write(data)
+        else:
+            sys.stdout.write(data)
+            sys.stdout.flush()
+    except Exception:
+        pass
+
+def log_scan(event, input_hash, result):
+    # Record a single validation, flushing when the batch is full or too old
+    try:
+        headers = event.get('headers') or {}
+        user_agent = headers.get('user-agent') or headers.get('User-Agent')
+        hash_prefix = re.sub(r'[^0-9A-Za-z]', '', input_hash or '')[:8] or '-'
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        record = f"SCAN {timestamp} {result} {hash_prefix} {classify_user_agent(user_agent)}"
+        with scan_lock:
+            scan_buffer.append(record)
+        if len(scan_buffer) >= SCAN_LOG_BATCH or time.monotonic() - scan_buffer_since >= SCAN_LOG_MAX_AGE:
+            flush_scan_log()
+    except Exception:
+        pass
+
+# write whatever is left when the runtime shuts down
+atexit.register(flush_scan_log)
+
+# Compact pass URLs carry the md5 as unpadded base32 at the end of the path: .../P/<26 characters>
+compact_path_pattern = re.compile(r'/P/([A-Z2-7]{26})/?$', re.IGNORECASE)
+
+def decode_compact_hash(path):
+    # Return the hex hash of a compact pass URL path, or None if the path is not one
+    match = compact_path_pattern.search(path or '')
+    if not match:
+        return None
+    return base64.b32decode(match.group(1).upper() + '======').hex()
+
+def load_member_index(csv_file_path):
+    # Read the whole member list once and index it by hash for constant time lookups
+    index = {}
     with open(csv_file_path, mode='r', encoding='utf-8') as csv_file:
         reader = csv.DictReader(csv_file)
 
@@ -10,23 +101,23 @@ def find_name_by_hash(csv_file_path, input_hash):
         if 'Vorname' not in reader.fieldnames or 'Nachname' not in reader.fieldnames or 'hash' not in reader.fieldnames:
             raise ValueError("The CSV file must contain 'Vorname', 'Nachname', and 'hash' columns.")
 
-        # Iterate through each row to find a matching hash
         for row in reader:
-            if row['hash'] == input_hash:
-                return row['Vorname'], row['Nachname']
+            index[row['hash']] = (row['Vorname'], row['Nachname'])
+    return index
 
-    # Return None if no match is found
-    return None, None
-def lambda_handler (event, context):
-    # This function is the entry point for AWS Lambda
-    # It will be triggered by an API Gateway event
-    # The event contains the query string parameters passed to the API Gateway
-    # read the input hash from the query string parameters
-    # and call the find_name_by_hash function to check membership
-    # and return the result as a HTML page
+# Path to your CSV file
+csv_file = './memberlist.csv'
+# The member index is loaded on first use and kept for the lifetime of the process
+member_index = None
 
-    # HTML template
-    html_template = """
+def get_member_index():
+    global member_index
+    if member_index is None:
+        member_index = load_member_index(csv_file)
+    return member_index
+
+# HTML template
+html_template = """
     <html>
         <head>
             <title>{title}</title>
@@ -53,47 +144,37 @@ def lambda_handler (event, context):
     </html>
     """
 
+def convert_to_html_entities(text):
+    """Convert German special characters to HTML entities."""
+    text = html.escape(text)  # Escape general HTML characters
+    replacements = {
+        'ä': '&auml;',
+        'ö': '&ouml;',
+        'ü': '&uuml;',
+        'Ä': '&Auml;',
+        'Ö': '&Ouml;',
+        'Ü': '&Uuml;',
+        'ß': '&szlig;'
+    }
+    for char, entity in replacements.items():
+        text = text.replace(char, entity)
+    return text
 
-    # Extract the hash from the query string parameters
-    input_hash = event.get('queryStringParameters', {}).get('hash')
-
+def check_membership(input_hash):
+    # Look up the hash and render the result page.
+    # Returns the status code, the HTML body and the result for the scan log.
+    # Shared by the Lambda handler and the self-hosted validation server.
     if not input_hash:
         html_content = html_template.format(
             background="#FF0000",  # Red background for error
             title="Fehler",
             message="Ung&uuml;ltige Anfrage!"
         )
-        status_code = 400  # Bad Request
-        return {
-            "statusCode": status_code,
-            "headers": {
-                "Content-Type": "text/html"
-            },
-            "body": html_content
-        }
-    
-    # Path to your CSV file
-    csv_file = './memberlist.csv'
+        return 400, html_content, 'invalid'  # Bad Request
 
     try:
         # Find the member by hash
-        vorname, nachname = find_name_by_hash(csv_file, input_hash)
-
-        def convert_to_html_entities(text):
-            """Convert German special characters to HTML entities."""
-            text = html.escape(text)  # Escape general HTML characters
-            replacements = {
-                'ä': '&auml;',
-                'ö': '&ouml;',
-                'ü': '&uuml;',
-                'Ä': '&Auml;',
-                'Ö': '&Ouml;',
-                'Ü': '&Uuml;',
-                'ß': '&szlig;'
-            }
-            for char, entity in replacements.items():
-                text = text.replace(char, entity)
-            return text
+        vorname, nachname = get_member_index().get(input_hash, (None, None))
 
         if vorname and nachname:
             # Escape HTML characters in vorname and nachname
@@ -105,7 +186,7 @@ def lambda_handler (event, context):
                 title="Aktuelles Mitglied gefunden",
                 message=f"{vorname_safe} {nachname_safe}</br>ist aktuell</br>Mitglied des RML"
             )
-            status_code = 200  # OK
+            return 200, html_content, 'member'  # OK
         else:
             # Return an HTML response for a non-member
             html_content = html_template.format(
@@ -113,31 +194,34 @@ def lambda_handler (event, context):
                 title="Kein Mitglied",
                 message="Kein RML-Mitglied!"
             )
-            status_code = 404
-        return {
-            "statusCode": status_code,
-            "headers": {
-                "Content-Type": "text/html"
-            },
-            "body": html_content            
-            }
+            return 404, html_content, 'unknown'
     except Exception as e:
         # Handle any unexpected errors
-        return {
-            "statusCode": 500,
-            "headers": {
-                "Content-Type": "text/html"
-            },
-            "body": f"<html><body><h1>Fehler</h1><p>Ein Fehler ist aufgetreten: {str(e)}</p></body></html>"
-        }
-    
-# # Test usage
-# csv_file = '../../test/memberlist.csv'  # Replace with the path to your CSV file
-# input_hash = 'f647bc22205e2bca2396c8b91169eb27'  # Replace with the hash you want to search for
-
-# vorname,nachname = find_name_by_hash(csv_file, input_hash)
-
-# if vorname and nachname:
-#     print(f"{vorname_safe} {nachname_safe} ist Mitglied im RML.")
-# else:
-#     print("Kein RML-Mitglied.")
\ No newline at end of file
+        html_content = f"<html><body><h1>Fehler</h1><p>Ein Fehler ist aufgetreten: {str(e)}</p></body></html>"
+        return 500, html_content, 'error'
+
+def lambda_handler (event, context):
+    # This function is the entry point for AWS Lambda
+    # It will be triggered by an API Gateway event
+    # The event contains the query string parameters passed to the API Gateway
+    # read the input hash from the query string parameters
+    # and call the check_membership function to check membership
+    # and return the result as a HTML page
+
+    # Extract the hash from the query string parameters (legacy passes)
+    # or from the path (compact passes)
+    input_hash = (event.get('queryStringParameters') or {}).get('hash')
+    if not input_hash:
+        input_hash = decode_compact_hash(event.get('rawPath'))
+
+    status_code, html_content, result = check_membership(input_hash)
+    log_scan(event, input_hash, result)
+    # Write the record before the environment is frozen, logging errors are swallowed
+    flush_scan_log()
+    return {
+        "statusCode": status_code,
+        "headers": {
+            "Content-Type": "text/html"
+        },
+        "body": html_content
+    }
@@ -0,0 +1,73 @@
+# Simple load test for the validation server (validation-server.py) or any other validation URL.
+# Sends requests with a mix of valid, unknown and missing hashes from a number of concurrent
+# clients and reports requests per second and response times.
+
+import argparse
+import csv
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+
+def run_client(url, hashes, deadline, results, lock):
+    # Keep sending requests until the deadline, collecting (status, latency) pairs
+    local_results = []
+    while time.monotonic() < deadline:
+        input_hash = random.choice(hashes)
+        request_url = f"{url}?hash={input_hash}" if input_hash else url
+        start = time.monotonic()
+        try:
+            with urllib.request.urlopen(request_url, timeout=10) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except Exception:
+            status = 0
+        local_results.append((status, time.monotonic() - start))
+    with lock:
+        results.extend(local_results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load test the membership validation server')
+    parser.add_argument('--url', default='http://127.0.0.1:8080/',
+                        help='Validation URL (default: http://127.0.0.1:8080/)')
+    parser.add_argument('--memberlist', default='lambda/memberlist.csv',
+                        help='Member list CSV file to take valid hashes from (default: lambda/memberlist.csv)')
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='Number of concurrent clients (default: 16)')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='Test duration in seconds (default: 10)')
+    args = parser.parse_args()
+
+    with open(args.memberlist, mode='r', encoding='utf-8') as csv_file:
+        valid_hashes = [row['hash'] for row in csv.DictReader(csv_file)]
+    # Mostly valid passes, some unknown and some empty requests
+    hashes = valid_hashes * 8 + ['0' * 32] * len(valid_hashes) + [None] * len(valid_hashes)
+
+    results = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+    clients = [threading.Thread(target=run_client, args=(args.url, hashes, deadline, results, lock))
+               for _ in range(args.concurrency)]
+    start = time.monotonic()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.monotonic() - start
+
+    if not results:
+        print("No requests completed.")
+    else:
+        latencies = sorted(latency for _, latency in results)
+        statuses = {}
+        for status, _ in results:
+            statuses[status] = statuses.get(status, 0) + 1
+        print(f"Requests:      {len(results)} in {elapsed:.1f}s with {args.concurrency} clients")
+        print(f"Requests/s:    {len(results) / elapsed:.1f}")
+        print(f"Latency p50:   {latencies[len(latencies) // 2] * 1000:.1f} ms")
+        print(f"Latency p95:   {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms")
+        print(f"Latency max:   {latencies[-1] * 1000:.1f} ms")
+        print("Status codes:  " + ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items())))
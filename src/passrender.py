@@ -0,0 +1,268 @@
+import base64
+import io
+import zlib
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+from stageprofile import profiler
+
+# Colors of a pass, kept exact in palette PNGs
+pass_colors = [(0, 0, 0), (255, 255, 255), (0, 128, 0)]
+
+# Rendering of membership passes.
+#
+# The QR code of a pass is encoded once (segno) and the same matrix is used for every
+# output format: a PNG image, a vector SVG and a page on a multi-up A4 PDF print sheet.
+
+class PassRenderer:
+    scale = 5     # pixels per QR module
+    border = 3    # quiet zone in modules
+    margin = 10   # green frame around the QR code in pixels
+
+    def __init__(self, logo_path, font_name):
+        # Logo and fonts are loaded once and reused for every pass
+        self.logo = Image.open(logo_path).convert("RGBA") if logo_path else None
+        self.font_name = font_name
+        self.fonts = {}
+        self.palette = None
+
+    def get_font(self, size):
+        if size not in self.fonts:
+            self.fonts[size] = ImageFont.truetype(self.font_name, size=size)
+        return self.fonts[size]
+
+    def fit_font(self, text, width):
+        # Adjust the font size until the text spans the given width
+        font = self.get_font(20)
+        text_width = font.getbbox(text)[2]
+        while text_width > width and font.size > 1:
+            font = self.get_font(font.size - 1)  # Reduce font size
+            text_width = font.getbbox(text)[2]
+
+        while text_width < width:
+            font = self.get_font(font.size + 1)  # Increase font size
+            text_width = font.getbbox(text)[2]
+        return font
+
+    def layout(self, qr, text):
+        # Geometry shared by the PNG and the SVG output
+        qr_size = qr.symbol_size(scale=self.scale, border=self.border)[0]
+        with profiler.stage('font fitting'):
+            font = self.fit_font(text, qr_size - 2 * self.margin)
+        text_width = font.getbbox(text)[2]
+        text_height = font.getbbox(text)[3]
+        width = qr_size + 2 * self.margin
+        height = qr_size + text_height + 20  # Add space for text
+        return {
+            'qr_size': qr_size,
+            'font': font,
+            'width': width,
+            'height': height,
+            'text_x': (width - text_width) / 2,
+            'text_y': qr_size + (height - qr_size - text_height - 10),  # Position text below the QR code
+        }
+
+    def render_image(self, qr, text):
+        # Render the pass as a PIL image
+        geometry = self.layout(qr, text)
+        qr_pil = qr.to_pil(scale=self.scale, border=self.border, dark='black', light='white').convert("RGB")
+
+        # Add logo to the QR code
+        if self.logo:
+            qr_pil.paste(self.logo, (qr_pil.size[0] // 2 - self.logo.size[0] // 2,
+                                     qr_pil.size[1] // 2 - self.logo.size[1] // 2), self.logo)
+
+        final_image = Image.new("RGB", (geometry['width'], geometry['height']), "green")
+        final_image.paste(qr_pil, (self.margin, self.margin))
+
+        # Add styled borders
+        draw = ImageDraw.Draw(final_image)
+        draw.rounded_rectangle((4, 4, final_image.size[0]-4, qr_pil.size[1]+13),
+                               outline="green", fill=None, width=7, radius=10)
+        draw.rounded_rectangle((9, 9, final_image.size[0]-9, qr_pil.size[1]+9),
+                               outline="black", fill=None, width=3, radius=10)
+
+        # Add member name text
+        draw.text((geometry['text_x'], geometry['text_y']), text, fill="white", font=geometry['font'])
+        return final_image
+
+    def get_palette(self):
+        # Fixed 16 color palette: the pass colors, a green to white ramp for the
+        # anti-aliased name and the main colors of the logo
+        if self.palette is None:
+            colors = list(pass_colors)
+            for step in range(1, 5):
+                t = step / 5
+                colors.append((round(255 * t), round(128 + 127 * t), round(255 * t)))
+            if self.logo:
+                logo_rgb = Image.new("RGBA", self.logo.size, "white")
+                logo_rgb.alpha_composite(self.logo)
+                logo_colors = logo_rgb.convert("RGB").quantize(16 - len(colors)).convert("RGB").getcolors()
+                for count, color in sorted(logo_colors, reverse=True):
+                    if color not in colors and len(colors) < 16:
+                        colors.append(color)
+            # Only the real entries, so the PNG is written with 4 bits per pixel
+            self.palette = Image.new("P", (1, 1))
+            self.palette.putpalette([value for color in colors for value in color])
+        return self.palette
+
+    def encode_png(self, image, palette=False):
+        # Encode a rendered pass as PNG. In palette mode the image is mapped without
+        # dithering onto the fixed palette. The quantizer only finds an approximate
+        # nearest color, so pixels of the pass colors are set to their exact palette
+        # entry afterwards: the QR modules stay exactly black and white.
+        data = io.BytesIO()
+        with profiler.stage('png encode'):
+            self.write_png(image, palette, data)
+        return data.getvalue()
+
+    def write_png(self, image, palette, data):
+        if palette:
+            image = image.convert("RGB")
+            indexed = image.quantize(palette=self.get_palette(), dither=Image.Dither.NONE)
+            channels = image.split()
+            for index, color in enumerate(pass_colors):
+                masks = [channel.point(lambda v, c=c: 255 if v == c else 0) for channel, c in zip(channels, color)]
+                mask = ImageChops.multiply(ImageChops.multiply(masks[0], masks[1]), masks[2])
+                indexed.paste(index, mask=mask)
+            indexed.save(data, "PNG", optimize=True)
+        else:
+            image.save(data, "PNG")
+
+    def render_svg(self, qr, text):
+        # Render the pass as an SVG document with the QR modules as vector path
+        geometry = self.layout(qr, text)
+        width, height, qr_size = geometry['width'], geometry['height'], geometry['qr_size']
+        offset = self.margin + self.border * self.scale
+
+        # One path segment per horizontal run of dark modules
+        segments = []
+        for y, row in enumerate(qr.matrix):
+            x = 0
+            while x < len(row):
+                if row[x]:
+                    start = x
+                    while x < len(row) and row[x]:
+                        x += 1
+                    segments.append(f"M{start},{y}h{x - start}v1h-{x - start}z")
+                else:
+                    x += 1
+
+        parts = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+            f'<rect width="{width}" height="{height}" fill="green"/>',
+            f'<rect x="{self.margin}" y="{self.margin}" width="{qr_size}" height="{qr_size}" fill="white"/>',
+            f'<path transform="translate({offset},{offset}) scale({self.scale})" fill="black" d="{"".join(segments)}"/>',
+        ]
+        if self.logo:
+            logo_data = io.BytesIO()
+            self.logo.save(logo_data, "PNG")
+            logo_x = self.margin + qr_size // 2 - self.logo.size[0] // 2
+            logo_y = self.margin + qr_size // 2 - self.logo.size[1] // 2
+            parts.append(f'<image x="{logo_x}" y="{logo_y}" width="{self.logo.size[0]}" height="{self.logo.size[1]}" '
+                         f'href="data:image/png;base64,{base64.b64encode(logo_data.getvalue()).decode("ascii")}"/>')
+        parts += [
+            f'<rect x="7.5" y="7.5" width="{width - 15}" height="{qr_size - 1}" rx="10" fill="none" stroke="green" stroke-width="7"/>',
+            f'<rect x="10.5" y="10.5" width="{width - 21}" height="{qr_size - 3}" rx="10" fill="none" stroke="black" stroke-width="3"/>',
+            f'<text x="{geometry["text_x"]}" y="{geometry["text_y"] + geometry["font"].getmetrics()[0]}" '
+            f'font-family="Open Sans, sans-serif" font-weight="500" font-size="{geometry["font"].size}" fill="white">'
+            f'{escape_xml(text)}</text>',
+            '</svg>',
+        ]
+        return "\n".join(parts) + "\n"
+
+def escape_xml(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+class PrintSheet:
+    # Multi-up A4 PDF with passes laid out in a grid.
+    # The file is written incrementally: every pass image is written as soon as it is added
+    # and only the object offsets are kept in memory.
+    page_width = 595   # A4 in points
+    page_height = 842
+
+    def __init__(self, path, columns=3, rows=4, margin=28):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.columns = columns
+        self.rows = rows
+        self.margin = margin
+        self.offsets = {}
+        self.next_object = 3  # 1 = catalog, 2 = page tree (written at the end)
+        self.pages = []
+        self.page_images = []
+        self.passes = 0
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write_object(self, body, stream=None, number=None):
+        if number is None:
+            number = self.next_object
+            self.next_object += 1
+        self.offsets[number] = self.file.tell()
+        self.file.write(f"{number} 0 obj\n".encode('ascii') + body)
+        if stream is not None:
+            self.file.write(b"\nstream\n" + stream + b"\nendstream")
+        self.file.write(b"\nendobj\n")
+        return number
+
+    def add(self, image):
+        # Add a rendered pass (PIL image) to the next free cell
+        with profiler.stage('pdf print sheet'):
+            self.add_image(image)
+
+    def add_image(self, image):
+        image = image.convert("RGB")
+        data = zlib.compress(image.tobytes())
+        number = self.write_object(
+            f"<< /Type /XObject /Subtype /Image /Width {image.size[0]} /Height {image.size[1]} "
+            f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode /Length {len(data)} >>".encode('ascii'),
+            data)
+        self.page_images.append((number, image.size))
+        self.passes += 1
+        if len(self.page_images) == self.columns * self.rows:
+            self.finish_page()
+
+    def finish_page(self):
+        if not self.page_images:
+            return
+        cell_width = (self.page_width - 2 * self.margin) / self.columns
+        cell_height = (self.page_height - 2 * self.margin) / self.rows
+        content = []
+        resources = []
+        for index, (number, (width, height)) in enumerate(self.page_images):
+            column, row = index % self.columns, index // self.columns
+            # Fit the pass into its cell keeping the aspect ratio, small gap between cells
+            factor = min((cell_width - 6) / width, (cell_height - 6) / height)
+            draw_width, draw_height = width * factor, height * factor
+            x = self.margin + column * cell_width + (cell_width - draw_width) / 2
+            y = self.page_height - self.margin - (row + 1) * cell_height + (cell_height - draw_height) / 2
+            content.append(f"q {draw_width:.2f} 0 0 {draw_height:.2f} {x:.2f} {y:.2f} cm /Im{index} Do Q")
+            resources.append(f"/Im{index} {number} 0 R")
+        stream = "\n".join(content).encode('ascii')
+        contents = self.write_object(f"<< /Length {len(stream)} >>".encode('ascii'), stream)
+        page = self.write_object(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.page_width} {self.page_height}] "
+            f"/Resources << /XObject << {' '.join(resources)} >> >> /Contents {contents} 0 R >>".encode('ascii'))
+        self.pages.append(page)
+        self.page_images = []
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.finish_page()
+        kids = " ".join(f"{page} 0 R" for page in self.pages)
+        self.write_object(f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>".encode('ascii'), number=2)
+        self.write_object(b"<< /Type /Catalog /Pages 2 0 R >>", number=1)
+
+        # Cross reference table
+        xref_offset = self.file.tell()
+        size = self.next_object
+        self.file.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode('ascii'))
+        for number in range(1, size):
+            self.file.write(f"{self.offsets[number]:010d} 00000 n \n".encode('ascii'))
+        self.file.write(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode('ascii'))
+        self.file.close()
@@ -0,0 +1,23 @@
+import base64
+from urllib.parse import urlsplit
+
+# URLs encoded in the pass QR codes.
+#
+# Legacy form:  https://<domain>/?hash=<32 hex digits md5>
+# Compact form: HTTPS://<DOMAIN>/<path>/P/<26 characters base32 md5>
+#
+# The compact form only uses characters of the QR alphanumeric mode (0-9, A-Z and $%*+-./: )
+# and a shorter digest, which results in a smaller QR version. Only scheme and host are
+# uppercased, as they are case insensitive; a path of url_domain (e.g. an API Gateway stage)
+# is kept as it is. The validation function accepts both forms.
+
+def compact_hash(hash_value):
+    # Encode the hex md5 as unpadded base32 (26 instead of 32 characters)
+    return base64.b32encode(bytes.fromhex(hash_value)).decode('ascii').rstrip('=')
+
+def pass_url(url_domain, hash_value, compact=False):
+    # Build the URL encoded in the QR code of a pass
+    if not compact:
+        return f"{url_domain}?hash={hash_value}"
+    url = urlsplit(url_domain)
+    return f"{url.scheme.upper()}://{url.netloc.upper()}{url.path.rstrip('/')}/P/{compact_hash(hash_value)}"
@@ -3,14 +3,17 @@
 # 'firstname', and an additional 'hash' column.
 # The output serves as the base data for the member pass validation and generation.
 
+import argparse
 import pandas as pd
 import hashlib
+from stageprofile import profiler, add_profile_arguments, setup_profiling
 
 pd.options.mode.chained_assignment = None  # default='warn'
 
 def filter_and_generate_csv(input_csv_path, output_csv_path):
     # Read the CSV file
-    df = pd.read_csv(input_csv_path,delimiter=';')
+    with profiler.stage('read csv'):
+        df = pd.read_csv(input_csv_path,delimiter=';')
 
     # Ensure the required columns exist
     if 'Vorname' not in df.columns or 'Nachname' not in df.columns or 'Austritt' not in df.columns:
@@ -24,17 +27,23 @@ def filter_and_generate_csv(input_csv_path, output_csv_path):
         concatenated = f"{row['Vorname']}{row['Nachname']}{row['RML MitglNr']}"
         return hashlib.md5(concatenated.encode('utf-8')).hexdigest()
 
-    filtered_df['hash'] = filtered_df.apply(generate_md5, axis=1)
+    with profiler.stage('hash'):
+        filtered_df['hash'] = filtered_df.apply(generate_md5, axis=1)
 
     # Select only the required columns for the output
     output_df = filtered_df[['RML MitglNr', 'Vorname', 'Nachname', 'hash']]
 
     # Write the output to a CSV file
-    output_df.to_csv(output_csv_path, index=False)
+    with profiler.stage('write csv'):
+        output_df.to_csv(output_csv_path, index=False)
 
     print(f"Filtered CSV file with hashes has been saved to {output_csv_path}")
 
 input_csv = 'ActiveMembers202601.csv'  # Replace with the path to your input CSV file
 output_csv = 'memberlist.csv'  # Replace with the desired output CSV file path
 
+parser = argparse.ArgumentParser(description='Filter the member export and add the pass hashes')
+add_profile_arguments(parser)
+setup_profiling(parser.parse_args())
+
 filter_and_generate_csv(input_csv, output_csv)
\ No newline at end of file
@@ -0,0 +1,42 @@
+# This script summarizes the scan audit log written by the validation Lambda (check-membership.py).
+# It reads one or more log files (e.g. exported from CloudWatch or written via SCAN_LOG_FILE),
+# picks out the "SCAN ..." records and prints the number of scans per day and per result.
+# Lines that are not scan records are ignored, so raw log exports can be used as they are.
+
+import pandas as pd
+import sys
+
+# SCAN <UTC timestamp> <result> <hash prefix> <user agent class>
+scan_pattern = r'SCAN (?P<timestamp>\S+) (?P<result>\S+) (?P<hash>\S+) (?P<agent>\S+)'
+
+def load_scans(log_files):
+    # Read all lines at once and extract the scan records in a single vectorized pass
+    lines = []
+    for log_file in log_files:
+        with open(log_file, 'r', encoding='utf-8', errors='replace') as file:
+            lines.extend(file.read().splitlines())
+
+    scans = pd.Series(lines, dtype=str).str.extract(scan_pattern).dropna()
+    scans['day'] = scans['timestamp'].str.slice(0, 10)
+    return scans
+
+def summarize_scans(scans):
+    # Scans per day and result, with a total column
+    summary = scans.groupby(['day', 'result']).size().unstack(fill_value=0)
+    summary['total'] = summary.sum(axis=1)
+    return summary
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python scan-stats.py <log_file> [<log_file> ...]")
+        sys.exit(1)
+
+    scans = load_scans(sys.argv[1:])
+    if scans.empty:
+        print("No scan records found.")
+        sys.exit(0)
+
+    print(summarize_scans(scans).to_string())
+    print()
+    print("Scans per user agent class:")
+    print(scans['agent'].value_counts().to_string())
@@ -0,0 +1,45 @@
+# Self-hosted validation server.
+# Serves the same "?hash=" check as the AWS Lambda function (lambda/check-membership.py) over HTTP,
+# e.g. on a local box or a field laptop at an event. The member list is loaded into memory at startup
+# and every request is handled in its own thread (threaded Werkzeug server).
+
+import argparse
+import importlib.util
+import os
+from flask import Flask, Response, request
+
+# Load the lookup and rendering code shared with the Lambda function
+lambda_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lambda', 'check-membership.py')
+spec = importlib.util.spec_from_file_location('check_membership', lambda_path)
+check_membership = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(check_membership)
+
+app = Flask(__name__)
+
+@app.route('/')
+@app.route('/P/<digest>', strict_slashes=False)
+def validate(digest=None):
+    input_hash = request.args.get('hash')
+    if not input_hash and digest:
+        input_hash = check_membership.decode_compact_hash(request.path)
+    status_code, html_content, result = check_membership.check_membership(input_hash)
+    check_membership.log_scan({'headers': {'user-agent': request.headers.get('User-Agent')}}, input_hash, result)
+    return Response(html_content, status=status_code, content_type='text/html')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run the membership validation server')
+    parser.add_argument('--memberlist', default=os.path.join(os.path.dirname(lambda_path), 'memberlist.csv'),
+                        help='Member list CSV file (default: lambda/memberlist.csv)')
+    parser.add_argument('--host', default='0.0.0.0',
+                        help='Address to listen on (default: 0.0.0.0)')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='Port to listen on (default: 8080)')
+    args = parser.parse_args()
+
+    # Preload the member index so that no request pays for reading the CSV
+    check_membership.csv_file = args.memberlist
+    members = len(check_membership.get_member_index())
+    print(f"Loaded {members} members from {args.memberlist}")
+
+    # One new thread per request
+    app.run(host=args.host, port=args.port, threaded=True)